@@ -1,228 +1,685 @@
+import functools
+import itertools
+import operator
+import re
+import sys
+from array import array
+from collections import defaultdict, deque, namedtuple
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
+_TOKEN_RE = re.compile(
+    r'[^\S\r\n]*(?:(?P<NUMBER>\d+)|(?P<WORD>[^\W\d]\w*)|(?P<OP>[=+\-*/%><])'
+    r'|(?P<NEWLINE>[\r\n][^\S\r\n]*)|(?P<ERROR>\S))'
+)
+_LEADING_WS_RE = re.compile(r'\s*')
+_KEYWORDS = {word: sys.intern(word.upper()) for word in ('let', 'print', 'if', 'else', 'while', 'for', 'to')}
+_T_NUMBER = sys.intern('NUMBER')
+_T_IDENTIFIER = sys.intern('IDENTIFIER')
+_T_INDENT = sys.intern('INDENT')
+_T_DEDENT = sys.intern('DEDENT')
+_T_EOL = sys.intern('EOL')
+_T_EOF = sys.intern('EOF')
+_CMP_OPS = frozenset(('>', '<'))
+_ADD_OPS = frozenset(('+', '-'))
+_MUL_OPS = frozenset(('*', '/', '%'))
+_EXPR_TERMINATORS = frozenset(('EOL', 'TO', 'INDENT', 'DEDENT', 'EOF'))
+
+OP_ADD = 1
+OP_SUB = 2
+OP_MUL = 3
+OP_DIV = 4
+OP_MOD = 5
+OP_GT = 6
+OP_LT = 7
+OP_NUM = 8
+OP_VAR = 9
+OP_NAME = 10
+_OP_TAGS = {'+': OP_ADD, '-': OP_SUB, '*': OP_MUL, '/': OP_DIV, '%': OP_MOD, '>': OP_GT, '<': OP_LT}
+
+LOAD_CONST = 0
+LOAD_VAR = 1
+STORE_VAR = 2
+ADD = 3
+SUB = 4
+MUL = 5
+DIV = 6
+MOD = 7
+GT = 8
+LT = 9
+JMP = 10
+JZ = 11
+PRINT = 12
+HALT = 13
+
+
+def _div(lval, rval):
+    return lval // rval if rval != 0 else 0
+
+
+def _mod(lval, rval):
+    return lval % rval if rval != 0 else 0
+
+
+_BINOPS = {
+    OP_ADD: operator.add,
+    OP_SUB: operator.sub,
+    OP_MUL: operator.mul,
+    OP_DIV: _div,
+    OP_MOD: _mod,
+    OP_GT: operator.gt,
+    OP_LT: operator.lt,
+}
+
+_HALTED = 0
+_OUTPUT_FULL = 1
+_UNDEFINED = 2
+_OVERFLOW = 3
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+_UNSET = 0
+_INT = 1
+_BOOL = 2
+_BINARY_OPCODES = {OP_ADD: ADD, OP_SUB: SUB, OP_MUL: MUL, OP_DIV: DIV, OP_MOD: MOD, OP_GT: GT, OP_LT: LT}
+
+
+Tokens = namedtuple('Tokens', ['types', 'values'])
+
+
+def _fold(node):
+    if node[0] in _BINOPS:
+        left = _fold(node[1])
+        right = _fold(node[2])
+        if left[0] == OP_NUM and right[0] == OP_NUM:
+            return (OP_NUM, _BINOPS[node[0]](left[1], right[1]))
+        return (node[0], left, right)
+    return node
+
+
+def _fold_statements(statements):
+    folded = []
+    for stmt in statements:
+        if stmt[0] == 'ASSIGN':
+            _, name, expr = stmt
+            folded.append(('ASSIGN', name, _fold(expr)))
+        elif stmt[0] == 'PRINT':
+            _, expr = stmt
+            folded.append(('PRINT', _fold(expr)))
+        elif stmt[0] == 'IF':
+            _, cond, true_branch, false_branch = stmt
+            folded.append(('IF', _fold(cond), _fold_statements(true_branch), _fold_statements(false_branch)))
+        elif stmt[0] == 'WHILE':
+            _, cond, body = stmt
+            folded.append(('WHILE', _fold(cond), _fold_statements(body)))
+        elif stmt[0] == 'FOR':
+            _, var, start_expr, end_expr, body = stmt
+            folded.append(('FOR', var, _fold(start_expr), _fold(end_expr), _fold_statements(body)))
+    return folded
+
+
+def _assigned(statements, names):
+    for stmt in statements:
+        if stmt[0] == 'ASSIGN':
+            names.add(stmt[1])
+        elif stmt[0] == 'IF':
+            _assigned(stmt[2], names)
+            _assigned(stmt[3], names)
+        elif stmt[0] == 'WHILE':
+            _assigned(stmt[2], names)
+        elif stmt[0] == 'FOR':
+            names.add(stmt[1])
+            _assigned(stmt[4], names)
+    return names
+
+
+def _hoist_temp(expr, hoisted, temps):
+    if expr[0] not in _BINOPS:
+        return expr
+    temp = hoisted.get(expr)
+    if temp is None:
+        temp = hoisted[expr] = f'$inv{next(temps)}'
+    return (OP_NAME, temp)
+
+
+def _hoist_subtrees(expr, defined, assigned, hoisted, temps):
+    # Returns the rewritten expression and whether it is invariant as a whole;
+    # invariant subtrees are left for the caller so only maximal ones are hoisted.
+    if expr[0] == OP_NAME:
+        return expr, expr[1] in defined and expr[1] not in assigned
+    if expr[0] not in _BINOPS:
+        return expr, True
+    op, left, right = expr
+    left, left_invariant = _hoist_subtrees(left, defined, assigned, hoisted, temps)
+    right, right_invariant = _hoist_subtrees(right, defined, assigned, hoisted, temps)
+    if left_invariant and right_invariant:
+        return expr, True
+    if left_invariant:
+        left = _hoist_temp(left, hoisted, temps)
+    if right_invariant:
+        right = _hoist_temp(right, hoisted, temps)
+    return (op, left, right), False
+
+
+def _hoist_expr(expr, defined, assigned, hoisted, temps):
+    expr, invariant = _hoist_subtrees(expr, defined, assigned, hoisted, temps)
+    if invariant:
+        return _hoist_temp(expr, hoisted, temps)
+    return expr
+
+
+def _hoist_statements(statements, defined, assigned, hoisted, temps):
+    def hoist(expr):
+        return _hoist_expr(expr, defined, assigned, hoisted, temps)
+
+    rewritten = []
+    for stmt in statements:
+        if stmt[0] == 'ASSIGN':
+            _, name, expr = stmt
+            rewritten.append(('ASSIGN', name, hoist(expr)))
+        elif stmt[0] == 'PRINT':
+            _, expr = stmt
+            rewritten.append(('PRINT', hoist(expr)))
+        elif stmt[0] == 'IF':
+            _, cond, true_branch, false_branch = stmt
+            rewritten.append(('IF', hoist(cond),
+                              _hoist_statements(true_branch, defined, assigned, hoisted, temps),
+                              _hoist_statements(false_branch, defined, assigned, hoisted, temps)))
+        elif stmt[0] == 'WHILE':
+            _, cond, body = stmt
+            rewritten.append(('WHILE', hoist(cond), _hoist_statements(body, defined, assigned, hoisted, temps)))
+        elif stmt[0] == 'FOR':
+            _, var, start_expr, end_expr, body = stmt
+            rewritten.append(('FOR', var, hoist(start_expr), hoist(end_expr),
+                              _hoist_statements(body, defined, assigned, hoisted, temps)))
+    return rewritten
+
+
+def _define(name, defined, added):
+    if name not in defined:
+        defined.add(name)
+        added.append(name)
+
+
+def _hoist_nested(statements, defined, temps):
+    added = []
+    statements = _hoist_loop_invariants(statements, defined, added, temps)
+    defined.difference_update(added)
+    return statements, added
+
+
+def _hoist_loop_invariants(statements, defined, added, temps):
+    # Only names definitely assigned before a loop are hoisted, so a loop that
+    # never runs cannot raise NameError from an expression moved above it.
+    # `defined` is shared by the whole pass: nested blocks record what they add
+    # in their own `added` list and take it back out when they are done.
+    hoisted_statements = []
+    for stmt in statements:
+        hoisted = {}
+        if stmt[0] == 'IF':
+            _, cond, true_branch, false_branch = stmt
+            true_branch, true_added = _hoist_nested(true_branch, defined, temps)
+            false_branch, false_added = _hoist_nested(false_branch, defined, temps)
+            stmt = ('IF', cond, true_branch, false_branch)
+            for name in set(true_added).intersection(false_added):
+                _define(name, defined, added)
+        elif stmt[0] == 'WHILE':
+            _, cond, body = stmt
+            body, _ = _hoist_nested(body, defined, temps)
+            assigned = _assigned(body, set())
+            cond = _hoist_expr(cond, defined, assigned, hoisted, temps)
+            stmt = ('WHILE', cond, _hoist_statements(body, defined, assigned, hoisted, temps))
+        elif stmt[0] == 'FOR':
+            _, var, start_expr, end_expr, body = stmt
+            body, _ = _hoist_nested(body, defined, temps)
+            assigned = _assigned(body, {var})
+            stmt = ('FOR', var, start_expr, end_expr, _hoist_statements(body, defined, assigned, hoisted, temps))
+        for expr, temp in hoisted.items():
+            hoisted_statements.append(('ASSIGN', temp, expr))
+            _define(temp, defined, added)
+        hoisted_statements.append(stmt)
+        if stmt[0] == 'ASSIGN':
+            _define(stmt[1], defined, added)
+    return hoisted_statements
+
+
+def _memo_pos(fn):
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(self):
+        if self._memo is None:
+            return fn(self)
+        table = self._memo[name]
+        pos = self.current
+        hit = table.get(pos)
+        if hit is not None:
+            self.current = hit[1]
+            return hit[0]
+        result = fn(self)
+        table[pos] = (result, self.current)
+        return result
+    return wrapper
+
+
 class Lexer:
     def __init__(self, source_code):
         self.code = source_code
-        self.tokens = []
+        self.token_types = []
+        self.token_values = []
 
     def tokenize(self):
-        lines = self.code.strip().splitlines()
+        for _ in self._scan(self.token_types, self.token_values):
+            pass
+        return Tokens(self.token_types, self.token_values)
+
+    def iter_tokens(self):
+        types = []
+        values = []
+        for _ in self._scan(types, values):
+            yield from zip(types, values)
+            types.clear()
+            values.clear()
+
+    def _scan(self, types, values):
+        # A NEWLINE match carries the next line's indentation; it is only
+        # applied once that line produces a token, so blank lines are skipped.
+        code = self.code
         indent_stack = [0]
-
-        for line in lines:
-            if not line.strip():
+        indent = 0
+        line_start = True
+
+        for m in _TOKEN_RE.finditer(code, _LEADING_WS_RE.match(code).end()):
+            kind = m.lastgroup
+            if kind == 'NEWLINE':
+                if not line_start:
+                    types.append(_T_EOL)
+                    values.append(None)
+                    line_start = True
+                    yield
+                indent = m.end() - m.start('NEWLINE') - 1
                 continue
 
-            stripped = line.lstrip()
-            indent = len(line) - len(stripped)
-
-            if indent > indent_stack[-1]:
-                self.tokens.append(('INDENT', None))
-                indent_stack.append(indent)
-            while indent < indent_stack[-1]:
-                self.tokens.append(('DEDENT', None))
-                indent_stack.pop()
-
-            for op in ['=', '+', '-', '*', '/', '%', '>', '<']:
-                stripped = stripped.replace(op, f' {op} ')
-
-            words = stripped.strip().split()
-            for word in words:
-                if word.isdigit():
-                    self.tokens.append(('NUMBER', int(word)))
-                elif word in ('let', 'print', 'if', 'else', 'while', 'for', 'to'):
-                    self.tokens.append((word.upper(), word))
-                elif word in ('=', '+', '-', '*', '/', '%', '>', '<'):
-                    self.tokens.append((word, word))
-                elif word.isidentifier():
-                    self.tokens.append(('IDENTIFIER', word))
-                else:
-                    raise SyntaxError(f"Unknown token: {word}")
-            self.tokens.append(('EOL', None))
-
-        while len(indent_stack) > 1:
-            self.tokens.append(('DEDENT', None))
-            indent_stack.pop()
-
-        self.tokens.append(('EOF', None))
-        return self.tokens
+            if line_start:
+                line_start = False
+                if indent > indent_stack[-1]:
+                    types.append(_T_INDENT)
+                    values.append(None)
+                    indent_stack.append(indent)
+                dedents = 0
+                while indent < indent_stack[-1]:
+                    indent_stack.pop()
+                    dedents += 1
+                if dedents:
+                    types.extend([_T_DEDENT] * dedents)
+                    values.extend([None] * dedents)
+
+            word = m[kind]
+            if kind == 'NUMBER':
+                types.append(_T_NUMBER)
+                values.append(int(word))
+            elif kind == 'WORD':
+                types.append(_KEYWORDS.get(word, _T_IDENTIFIER))
+                values.append(word)
+            elif kind == 'OP':
+                types.append(word)
+                values.append(word)
+            else:
+                raise SyntaxError(f"Unknown token: {word}")
+
+        if not line_start:
+            types.append(_T_EOL)
+            values.append(None)
+            yield
+
+        dedents = len(indent_stack) - 1
+        types.extend([_T_DEDENT] * dedents)
+        values.extend([None] * dedents)
+        del indent_stack[1:]
+
+        types.append(_T_EOF)
+        values.append(None)
+        yield
+
+
+class _PeekColumn:
+    def __init__(self, buf, field):
+        self._buf = buf
+        self._field = field
+
+    def __getitem__(self, i):
+        return self._buf[i][self._field]
+
+
+class _PeekBuf:
+    # Keeps only the token before the furthest one requested, so the parser
+    # can look one token ahead without the whole stream being held in memory.
+    def __init__(self, tokens):
+        self._tokens = iter(tokens)
+        self._buf = deque()
+        self._base = 0
+        self.types = _PeekColumn(self, 0)
+        self.values = _PeekColumn(self, 1)
+
+    def __getitem__(self, i):
+        buf = self._buf
+        while self._base + len(buf) <= i:
+            buf.append(next(self._tokens, (_T_EOF, None)))
+        while self._base < i - 1:
+            buf.popleft()
+            self._base += 1
+        if i < self._base:
+            # Not an IndexError: peek() reads those as running off the end.
+            raise LookupError(f"Token {i} has already been released")
+        return buf[i - self._base]
 
 
 class Parser:
     def __init__(self, tokens):
-        self.tokens = tokens
+        if not isinstance(tokens, Tokens) and isinstance(tokens, (list, tuple)):
+            tokens = Tokens([token[0] for token in tokens], [token[1] for token in tokens])
+        if isinstance(tokens, Tokens):
+            self.token_types = tokens.types
+            self.token_values = tokens.values
+            self._memo = defaultdict(dict)
+        else:
+            buf = _PeekBuf(tokens)
+            self.token_types = buf.types
+            self.token_values = buf.values
+            self._memo = None
         self.current = 0
+        self._stmt_dispatch = {
+            'LET': self._parse_let,
+            'PRINT': self._parse_print,
+            'IF': self._parse_if,
+            'WHILE': self._parse_while,
+            'FOR': self._parse_for,
+            'IDENTIFIER': self._parse_assign,
+        }
 
     def peek(self):
-        if self.current < len(self.tokens):
-            return self.tokens[self.current]
-        return ('EOF', None)
+        try:
+            return (self.token_types[self.current], self.token_values[self.current])
+        except IndexError:
+            return ('EOF', None)
 
     def consume(self, expected_type=None):
-        if self.current >= len(self.tokens):
-            raise SyntaxError("Unexpected end of input")
-        token = self.tokens[self.current]
-        if expected_type and token[0] != expected_type:
-            raise SyntaxError(f"Expected {expected_type}, got {token[0]}")
-        self.current += 1
-        return token
+        i = self.current
+        try:
+            token_type = self.token_types[i]
+        except IndexError:
+            raise SyntaxError("Unexpected end of input") from None
+        if expected_type and token_type != expected_type:
+            raise SyntaxError(f"Expected {expected_type}, got {token_type}")
+        self.current = i + 1
+        return (token_type, self.token_values[i])
+
+    def _type_at(self, k):
+        try:
+            return self.token_types[k]
+        except IndexError:
+            return 'EOF'
 
     def match(self, *types):
-        if self.current < len(self.tokens) and self.tokens[self.current][0] in types:
+        if self._type_at(self.current) in types:
             self.current += 1
             return True
         return False
 
     def parse(self):
+        if self._memo is not None:
+            self._memo.clear()
+        types = self.token_types
         statements = []
-        while self.peek()[0] != 'EOF':
-            if self.peek()[0] == 'EOL':
-                self.consume('EOL')
+        i = self.current
+        while types[i] != 'EOF':
+            if types[i] == 'EOL':
+                i += 1
                 continue
+            self.current = i
             statements.append(self.parse_statement())
-        return statements
+            i = self.current
+        self.current = i
+        return _hoist_loop_invariants(_fold_statements(statements), set(), [], itertools.count())
 
+    @_memo_pos
     def parse_block(self):
         self.consume('INDENT')
+        types = self.token_types
         block = []
+        i = self.current
         while True:
-            token = self.peek()[0]
+            token = types[i]
             if token == 'DEDENT':
                 break
             if token == 'EOL':
-                self.consume('EOL')
+                i += 1
                 continue
+            self.current = i
             block.append(self.parse_statement())
+            i = self.current
+        self.current = i
         self.consume('DEDENT')
         return block
 
     def parse_statement(self):
-        if self.match('LET'):
-            name = self.consume('IDENTIFIER')[1]
-            self.consume('=')
-            expr = self.parse_expression()
-            self.consume('EOL')
-            return ('ASSIGN', name, expr)
-
-        if self.peek()[0] == 'IDENTIFIER':
-            if self.current + 1 < len(self.tokens) and self.tokens[self.current + 1][0] == '=':
-                name = self.consume('IDENTIFIER')[1]
-                self.consume('=')
-                expr = self.parse_expression()
-                self.consume('EOL')
-                return ('ASSIGN', name, expr)
-
-        if self.match('PRINT'):
-            expr = self.parse_expression()
+        handler = self._stmt_dispatch.get(self._type_at(self.current))
+        if handler is None:
+            raise SyntaxError(f"Unknown statement at token {self.peek()}")
+        return handler()
+
+    def _parse_let(self):
+        self.consume('LET')
+        return self._parse_assignment()
+
+    def _parse_assign(self):
+        if self._type_at(self.current + 1) != '=':
+            raise SyntaxError(f"Unknown statement at token {self.peek()}")
+        return self._parse_assignment()
+
+    def _parse_assignment(self):
+        name = self.consume('IDENTIFIER')[1]
+        self.consume('=')
+        expr = self.parse_expression()
+        self.consume('EOL')
+        return ('ASSIGN', name, expr)
+
+    def _parse_print(self):
+        self.consume('PRINT')
+        expr = self.parse_expression()
+        self.consume('EOL')
+        return ('PRINT', expr)
+
+    def _parse_if(self):
+        self.consume('IF')
+        condition = self.parse_expression()
+        self.consume('EOL')
+        true_branch = self.parse_block()
+        false_branch = []
+        if self.match('ELSE'):
             self.consume('EOL')
-            return ('PRINT', expr)
-
-        if self.match('IF'):
-            condition = self.parse_expression()
-            self.consume('EOL')
-            true_branch = self.parse_block()
-            false_branch = []
-            if self.match('ELSE'):
-                self.consume('EOL')
-                false_branch = self.parse_block()
-            return ('IF', condition, true_branch, false_branch)
-
-        if self.match('WHILE'):
-            condition = self.parse_expression()
-            self.consume('EOL')
-            body = self.parse_block()
-            return ('WHILE', condition, body)
-
-        if self.match('FOR'):
-            var = self.consume('IDENTIFIER')[1]
-            self.consume('=')
-            start = self.parse_expression()
-            self.consume('TO')
-            end = self.parse_expression()
-            self.consume('EOL')
-            body = self.parse_block()
-            return ('FOR', var, start, end, body)
-
-        raise SyntaxError(f"Unknown statement at token {self.peek()}")
-
-
+            false_branch = self.parse_block()
+        return ('IF', condition, true_branch, false_branch)
+
+    def _parse_while(self):
+        self.consume('WHILE')
+        condition = self.parse_expression()
+        self.consume('EOL')
+        body = self.parse_block()
+        return ('WHILE', condition, body)
+
+    def _parse_for(self):
+        self.consume('FOR')
+        var = self.consume('IDENTIFIER')[1]
+        self.consume('=')
+        start = self.parse_expression()
+        self.consume('TO')
+        end = self.parse_expression()
+        self.consume('EOL')
+        body = self.parse_block()
+        return ('FOR', var, start, end, body)
+
+    @_memo_pos
     def parse_expression(self):
-        return self.parse_comparison()
-
-    def parse_comparison(self):
-        expr = self.parse_term()
-        while self.peek()[0] in ('>', '<'):
-            op = self.consume()[0]
+        expr = self.parse_primary()
+        if self.token_types[self.current] in _EXPR_TERMINATORS:
+            return expr
+        return self.parse_comparison(expr)
+
+    def parse_comparison(self, expr=None):
+        types = self.token_types
+        expr = self.parse_term(expr)
+        i = self.current
+        while types[i] in _CMP_OPS:
+            op = types[i]
+            self.current = i + 1
             right = self.parse_term()
-            expr = (op, expr, right)
+            i = self.current
+            expr = (_OP_TAGS[op], expr, right)
         return expr
 
-    def parse_term(self):
-        expr = self.parse_factor()
-        while self.peek()[0] in ('+', '-'):
-            op = self.consume()[0]
+    def parse_term(self, expr=None):
+        types = self.token_types
+        expr = self.parse_factor(expr)
+        i = self.current
+        while types[i] in _ADD_OPS:
+            op = types[i]
+            self.current = i + 1
             right = self.parse_factor()
-            expr = (op, expr, right)
+            i = self.current
+            expr = (_OP_TAGS[op], expr, right)
         return expr
 
-    def parse_factor(self):
-        expr = self.parse_unary()
-        while self.peek()[0] in ('*', '/', '%'):
-            op = self.consume()[0]
-            right = self.parse_unary()
-            expr = (op, expr, right)
+    def parse_factor(self, expr=None):
+        types = self.token_types
+        if expr is None:
+            expr = self.parse_primary()
+        i = self.current
+        while types[i] in _MUL_OPS:
+            op = types[i]
+            self.current = i + 1
+            right = self.parse_primary()
+            i = self.current
+            expr = (_OP_TAGS[op], expr, right)
         return expr
 
-    def parse_unary(self):
-        return self.parse_primary()
-
     def parse_primary(self):
-        token = self.consume()
-        if token[0] in ('NUMBER', 'IDENTIFIER'):
-            return token
-        raise SyntaxError(f"Expected number or identifier, got {token[0]}")
+        token_type, value = self.consume()
+        if token_type == 'NUMBER':
+            return (OP_NUM, value)
+        if token_type == 'IDENTIFIER':
+            return (OP_NAME, value)
+        raise SyntaxError(f"Expected number or identifier, got {token_type}")
+
+
+class Resolver:
+    def __init__(self):
+        self.slots = {}
+        self.names = []
+
+    def slot(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
+
+    def resolve(self, statements):
+        resolved = []
+        for stmt in statements:
+            if stmt[0] == 'ASSIGN':
+                _, name, expr = stmt
+                expr = self.resolve_expr(expr)
+                resolved.append(('ASSIGN', self.slot(name), expr))
+            elif stmt[0] == 'PRINT':
+                _, expr = stmt
+                resolved.append(('PRINT', self.resolve_expr(expr)))
+            elif stmt[0] == 'IF':
+                _, cond, true_branch, false_branch = stmt
+                resolved.append(('IF', self.resolve_expr(cond), self.resolve(true_branch), self.resolve(false_branch)))
+            elif stmt[0] == 'WHILE':
+                _, cond, body = stmt
+                resolved.append(('WHILE', self.resolve_expr(cond), self.resolve(body)))
+            elif stmt[0] == 'FOR':
+                _, var, start_expr, end_expr, body = stmt
+                start_expr = self.resolve_expr(start_expr)
+                end_expr = self.resolve_expr(end_expr)
+                resolved.append(('FOR', self.slot(var), start_expr, end_expr, self.resolve(body)))
+        return resolved
+
+    def resolve_expr(self, expr):
+        if expr[0] == OP_NAME:
+            return (OP_VAR, self.slot(expr[1]))
+        if expr[0] in _BINOPS:
+            op, left, right = expr
+            return (op, self.resolve_expr(left), self.resolve_expr(right))
+        return expr
 
 
 class Interpreter:
     def __init__(self, statements):
-        self.statements = statements
-        self.env = {}
+        resolver = Resolver()
+        self.statements = resolver.resolve(statements)
+        self.names = resolver.names
+        self.vars = [None] * len(self.names)
 
-    def eval_expr(self, expr):
-        if isinstance(expr, tuple) and expr[0] in ('+', '-', '*', '/', '%', '>', '<'):
-            op, left, right = expr
-            lval = self.eval_expr(left)
-            rval = self.eval_expr(right)
-            if op == '+': return lval + rval
-            if op == '-': return lval - rval
-            if op == '*': return lval * rval
-            if op == '/': return lval // rval if rval != 0 else 0
-            if op == '%': return lval % rval if rval != 0 else 0
-            if op == '>': return lval > rval
-            if op == '<': return lval < rval
-        elif expr[0] == 'NUMBER':
-            return expr[1]
-        elif expr[0] == 'IDENTIFIER':
-            var = expr[1]
-            if var in self.env:
-                return self.env[var]
-            else:
-                raise NameError(f"Undefined variable '{var}'")
-        else:
-            return expr
+    def _eval_add(self, node):
+        return self.eval_expr(node[1]) + self.eval_expr(node[2])
+
+    def _eval_sub(self, node):
+        return self.eval_expr(node[1]) - self.eval_expr(node[2])
+
+    def _eval_mul(self, node):
+        return self.eval_expr(node[1]) * self.eval_expr(node[2])
+
+    def _eval_div(self, node):
+        return _div(self.eval_expr(node[1]), self.eval_expr(node[2]))
+
+    def _eval_mod(self, node):
+        return _mod(self.eval_expr(node[1]), self.eval_expr(node[2]))
+
+    def _eval_gt(self, node):
+        return self.eval_expr(node[1]) > self.eval_expr(node[2])
+
+    def _eval_lt(self, node):
+        return self.eval_expr(node[1]) < self.eval_expr(node[2])
+
+    def _load_num(self, node):
+        return node[1]
+
+    def _load_var(self, node):
+        value = self.vars[node[1]]
+        if value is None:
+            raise NameError(f"Undefined variable '{self.names[node[1]]}'")
+        return value
+
+    _ops = (None, _eval_add, _eval_sub, _eval_mul, _eval_div, _eval_mod, _eval_gt, _eval_lt, _load_num, _load_var)
+
+    def eval_expr(self, node):
+        return self._ops[node[0]](self, node)
+
+    def print_output(self, value):
+        print(value)
 
     def exec(self):
         self.execute_statements(self.statements)
 
     def execute_statements(self, statements):
+        execute = self.execute
         for stmt in statements:
-            self.execute(stmt)
+            execute(stmt)
 
     def execute(self, stmt):
         if stmt[0] == 'ASSIGN':
-            _, name, expr = stmt
-            self.env[name] = self.eval_expr(expr)
+            _, slot, expr = stmt
+            self.vars[slot] = self.eval_expr(expr)
         elif stmt[0] == 'PRINT':
             _, expr = stmt
-            print(self.eval_expr(expr))
+            self.print_output(self.eval_expr(expr))
         elif stmt[0] == 'IF':
             _, cond, true_branch, false_branch = stmt
             if self.eval_expr(cond):
@@ -231,13 +688,253 @@ class Interpreter:
                 self.execute_statements(false_branch)
         elif stmt[0] == 'WHILE':
             _, cond, body = stmt
-            while self.eval_expr(cond):
-                self.execute_statements(body)
+            eval_expr = self.eval_expr
+            execute_statements = self.execute_statements
+            while eval_expr(cond):
+                execute_statements(body)
         elif stmt[0] == 'FOR':
-            _, var, start_expr, end_expr, body = stmt
+            _, slot, start_expr, end_expr, body = stmt
             start = self.eval_expr(start_expr)
             end = self.eval_expr(end_expr)
+            execute_statements = self.execute_statements
+            vars_ = self.vars
             for i in range(start, end + 1):
-                self.env[var] = i
-                self.execute_statements(body)
+                vars_[slot] = i
+                execute_statements(body)
+
+
+class Compiler:
+    def __init__(self):
+        self.code = array('i')
+        self.consts = []
+        self.var_map = {}
+
+    def compile(self, statements):
+        resolver = Resolver()
+        statements = resolver.resolve(statements)
+        self.code = array('i')
+        self.consts = []
+        self.var_map = resolver.slots
+        self.compile_statements(statements)
+        self.code.append(HALT)
+        return self.code, self.consts, self.var_map
+
+    def temp_slot(self):
+        slot = self.var_map[f'${len(self.var_map)}'] = len(self.var_map)
+        return slot
+
+    def emit(self, *words):
+        self.code.extend(words)
+        return len(self.code) - 1
+
+    def patch(self, at, target):
+        self.code[at] = target
+
+    def compile_expr(self, expr):
+        kind = expr[0]
+        if kind == OP_NUM:
+            self.emit(LOAD_CONST, len(self.consts))
+            self.consts.append(expr[1])
+        elif kind == OP_VAR:
+            self.emit(LOAD_VAR, expr[1])
+        else:
+            self.compile_expr(expr[1])
+            self.compile_expr(expr[2])
+            self.emit(_BINARY_OPCODES[kind])
+
+    def compile_statements(self, statements):
+        for stmt in statements:
+            self.compile_statement(stmt)
 
+    def compile_statement(self, stmt):
+        if stmt[0] == 'ASSIGN':
+            _, slot, expr = stmt
+            self.compile_expr(expr)
+            self.emit(STORE_VAR, slot)
+        elif stmt[0] == 'PRINT':
+            _, expr = stmt
+            self.compile_expr(expr)
+            self.emit(PRINT)
+        elif stmt[0] == 'IF':
+            _, cond, true_branch, false_branch = stmt
+            self.compile_expr(cond)
+            to_else = self.emit(JZ, 0)
+            self.compile_statements(true_branch)
+            to_end = self.emit(JMP, 0)
+            self.patch(to_else, len(self.code))
+            self.compile_statements(false_branch)
+            self.patch(to_end, len(self.code))
+        elif stmt[0] == 'WHILE':
+            _, cond, body = stmt
+            top = len(self.code)
+            self.compile_expr(cond)
+            to_end = self.emit(JZ, 0)
+            self.compile_statements(body)
+            self.emit(JMP, top)
+            self.patch(to_end, len(self.code))
+        elif stmt[0] == 'FOR':
+            # The counter lives in a hidden slot so the body can reassign
+            # the loop variable without changing the iteration, as range() does.
+            _, slot, start_expr, end_expr, body = stmt
+            counter = self.temp_slot()
+            limit = self.temp_slot()
+            one = len(self.consts)
+            self.consts.append(1)
+            self.compile_expr(start_expr)
+            self.emit(STORE_VAR, counter)
+            self.compile_expr(end_expr)
+            self.emit(LOAD_CONST, one, ADD, STORE_VAR, limit)
+            top = len(self.code)
+            to_end = self.emit(LOAD_VAR, limit, LOAD_VAR, counter, GT, JZ, 0)
+            self.emit(LOAD_VAR, counter, STORE_VAR, slot)
+            self.compile_statements(body)
+            self.emit(LOAD_VAR, counter, LOAD_CONST, one, ADD, STORE_VAR, counter, JMP, top)
+            self.patch(to_end, len(self.code))
+
+
+# Values carry a kind next to them (_INT or _BOOL, _UNSET for a variable
+# never assigned) so comparisons print as True/False even on the int64 path.
+# int64 arithmetic wraps silently under numba, so with `checked` set any
+# ADD/SUB/MUL/DIV whose result would leave the range stops with _OVERFLOW,
+# leaving pc and the stack on that instruction.
+def _run(code, consts, const_kinds, vars_, var_kinds, stack, stack_kinds, out, out_kinds, pc, sp, checked):
+    n_out = 0
+    while True:
+        op = code[pc]
+        pc += 1
+        if op == LOAD_VAR:
+            slot = code[pc]
+            kind = var_kinds[slot]
+            if kind == _UNSET:
+                return _UNDEFINED, pc, sp, n_out
+            stack[sp] = vars_[slot]
+            stack_kinds[sp] = kind
+            sp += 1
+            pc += 1
+        elif op == LOAD_CONST:
+            index = code[pc]
+            stack[sp] = consts[index]
+            stack_kinds[sp] = const_kinds[index]
+            sp += 1
+            pc += 1
+        elif op == STORE_VAR:
+            sp -= 1
+            slot = code[pc]
+            vars_[slot] = stack[sp]
+            var_kinds[slot] = stack_kinds[sp]
+            pc += 1
+        elif op == JZ:
+            sp -= 1
+            if stack[sp]:
+                pc += 1
+            else:
+                pc = code[pc]
+        elif op == JMP:
+            pc = code[pc]
+        elif op == HALT:
+            return _HALTED, pc, sp, n_out
+        elif op == PRINT:
+            sp -= 1
+            out[n_out] = stack[sp]
+            out_kinds[n_out] = stack_kinds[sp]
+            n_out += 1
+            if n_out == len(out):
+                return _OUTPUT_FULL, pc, sp, n_out
+        else:
+            rval = stack[sp - 1]
+            lval = stack[sp - 2]
+            if op == ADD:
+                if checked and (lval > _INT64_MAX - rval if rval > 0 else lval < _INT64_MIN - rval):
+                    return _OVERFLOW, pc - 1, sp, n_out
+                result = lval + rval
+            elif op == SUB:
+                if checked and (lval > _INT64_MAX + rval if rval < 0 else lval < _INT64_MIN + rval):
+                    return _OVERFLOW, pc - 1, sp, n_out
+                result = lval - rval
+            elif op == MUL:
+                # The float product is only a few ulps off, far inside the
+                # margin below 2**63; a false alarm just finishes in Python.
+                if checked and abs(float(lval) * float(rval)) > 9.2e18:
+                    return _OVERFLOW, pc - 1, sp, n_out
+                result = lval * rval
+            elif op == DIV:
+                if checked and lval == _INT64_MIN and rval == -1:
+                    return _OVERFLOW, pc - 1, sp, n_out
+                result = lval // rval if rval != 0 else 0
+            elif op == MOD:
+                result = lval % rval if rval != 0 else 0
+            elif op == GT:
+                result = lval > rval
+            else:
+                result = lval < rval
+            sp -= 1
+            stack[sp - 1] = result
+            stack_kinds[sp - 1] = _BOOL if op >= GT else _INT
+
+
+_run_jit = njit(cache=True)(_run) if njit is not None else None
+JIT_AVAILABLE = _run_jit is not None
+
+
+class VM:
+    def __init__(self, code, consts, var_map, print_output=print, jit=JIT_AVAILABLE):
+        if jit and not JIT_AVAILABLE:
+            raise RuntimeError("jit=True needs numba and numpy installed")
+        self.var_map = var_map
+        self.print_output = print_output
+        const_kinds = [_BOOL if type(value) is bool else _INT for value in consts]
+        if jit and all(_INT64_MIN <= value <= _INT64_MAX for value in consts):
+            self._run = _run_jit
+            self.code = np.asarray(code, dtype=np.int32)
+            self.consts = np.array(consts, dtype=np.int64)
+            self.const_kinds = np.array(const_kinds, dtype=np.uint8)
+            self.vars = np.zeros(len(var_map), dtype=np.int64)
+            self.var_kinds = np.zeros(len(var_map), dtype=np.uint8)
+            self.stack = np.zeros(64, dtype=np.int64)
+            self.stack_kinds = np.zeros(64, dtype=np.uint8)
+            self.out = np.zeros(1024, dtype=np.int64)
+            self.out_kinds = np.zeros(1024, dtype=np.uint8)
+        else:
+            self._run = _run
+            self.code = code
+            self.consts = consts
+            self.const_kinds = const_kinds
+            self.vars = [0] * len(var_map)
+            self.var_kinds = bytearray(len(var_map))
+            self.stack = [0] * 64
+            self.stack_kinds = bytearray(64)
+            self.out = [0] * 1024
+            self.out_kinds = bytearray(1024)
+
+    def _leave_jit(self):
+        # Copy the machine state into Python ints so the pure-Python loop can
+        # carry on from the instruction that would have overflowed.
+        self._run = _run
+        self.code = self.code.tolist()
+        self.consts = self.consts.tolist()
+        self.const_kinds = bytearray(self.const_kinds)
+        self.vars = self.vars.tolist()
+        self.var_kinds = bytearray(self.var_kinds)
+        self.stack = self.stack.tolist()
+        self.stack_kinds = bytearray(self.stack_kinds)
+        self.out = [0] * len(self.out)
+        self.out_kinds = bytearray(len(self.out))
+
+    def run(self):
+        pc = 0
+        sp = 0
+        while True:
+            status, pc, sp, n_out = self._run(self.code, self.consts, self.const_kinds, self.vars, self.var_kinds,
+                                              self.stack, self.stack_kinds, self.out, self.out_kinds, pc, sp,
+                                              self._run is _run_jit)
+            for i in range(n_out):
+                value = self.out[i]
+                self.print_output(bool(value) if self.out_kinds[i] == _BOOL else int(value))
+            if status == _HALTED:
+                return
+            if status == _OVERFLOW:
+                self._leave_jit()
+            if status == _UNDEFINED:
+                slot = self.code[pc]
+                name = next(name for name, index in self.var_map.items() if index == slot)
+                raise NameError(f"Undefined variable '{name}'")
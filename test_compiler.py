@@ -0,0 +1,231 @@
+import os
+import unittest
+
+from compiler import (JIT_AVAILABLE, OP_ADD, OP_LT, OP_MUL, OP_NAME, OP_NUM, VM, Compiler, Interpreter,
+                      Lexer, Parser)
+
+with open(os.path.join(os.path.dirname(__file__), 'test.txt.txt')) as f:
+    SAMPLE = f.read()
+
+PROGRAMS = {
+    'sample': SAMPLE,
+    'loops': """
+let n = 5
+let k = 3
+let total = 0
+for i = 1 to n
+    for j = 1 to k
+        let total = total + i * j + n * k
+    if total % 2 > 0
+        print total
+    else
+        print 0 - total
+let c = 0
+while c < n * 2 + 1
+    let c = c + 1
+print c
+for q = 5 to 1
+    print q
+""",
+    'booleans': """
+let b = 3 > 2
+print b
+print b + 1
+print 1 < 0
+print 7 / 0
+print 7 % 0
+""",
+}
+
+
+def parse(source):
+    return Parser(Lexer(source).tokenize()).parse()
+
+
+def interpret(source):
+    output = []
+    interpreter = Interpreter(parse(source))
+    interpreter.print_output = output.append
+    interpreter.exec()
+    return output
+
+
+def run_vm(source, jit):
+    output = []
+    code, consts, var_map = Compiler().compile(parse(source))
+    VM(code, consts, var_map, output.append, jit=jit).run()
+    return output
+
+
+class VMTestMixin:
+    jit = False
+
+    def test_matches_interpreter(self):
+        for name, source in PROGRAMS.items():
+            with self.subTest(program=name):
+                self.assertEqual(run_vm(source, self.jit), interpret(source))
+
+    def test_output_buffer_is_flushed(self):
+        source = "for i = 1 to 2500\n    print i\n"
+        self.assertEqual(run_vm(source, self.jit), list(range(1, 2501)))
+
+    def test_undefined_variable(self):
+        with self.assertRaisesRegex(NameError, "'y'"):
+            run_vm("let x = 1\nprint y\n", self.jit)
+
+    def test_large_integers(self):
+        source = "let x = 99999999999\nprint x * x * x\n"
+        self.assertEqual(run_vm(source, self.jit), [999999999970000000000299999999999])
+
+    def test_large_constants(self):
+        self.assertEqual(run_vm("print 99999999999999999999999\n", self.jit), [99999999999999999999999])
+
+    def test_overflow_resumes_mid_expression(self):
+        source = ("let x = 4611686018427387904\nprint x\nprint 1 + x * 2\nprint x + x - 1\n"
+                  "let m = 0 - 9223372036854775807 - 1\nlet n = 0 - 1\nprint m - 1\nprint m / n\n")
+        self.assertEqual(run_vm(source, self.jit), [
+            4611686018427387904, 9223372036854775809, 9223372036854775807,
+            -9223372036854775809, 9223372036854775808,
+        ])
+
+
+class PythonVMTest(VMTestMixin, unittest.TestCase):
+    jit = False
+
+
+@unittest.skipUnless(JIT_AVAILABLE, "numba is not installed")
+class JitVMTest(VMTestMixin, unittest.TestCase):
+    jit = True
+
+
+def num(value):
+    return (OP_NUM, value)
+
+
+def name(var):
+    return (OP_NAME, var)
+
+
+class LexerTest(unittest.TestCase):
+    def test_crlf_matches_lf(self):
+        for name, source in PROGRAMS.items():
+            with self.subTest(program=name):
+                self.assertEqual(Lexer(source.replace('\n', '\r\n')).tokenize(), Lexer(source).tokenize())
+
+    def test_tab_indentation(self):
+        tokens = Lexer("if 1 > 0\n\tprint 1\nprint 2\n").tokenize()
+        self.assertEqual(tokens.types, ['IF', 'NUMBER', '>', 'NUMBER', 'EOL', 'INDENT', 'PRINT', 'NUMBER', 'EOL',
+                                        'DEDENT', 'PRINT', 'NUMBER', 'EOL', 'EOF'])
+
+    def test_trailing_spaces(self):
+        self.assertEqual(Lexer("let x = 1   \nprint x \t\n  \n").tokenize(), Lexer("let x = 1\nprint x\n").tokenize())
+
+    def test_unicode_identifiers(self):
+        tokens = Lexer("let é = 1\nprint é\n").tokenize()
+        self.assertEqual(tokens.types[:2], ['LET', 'IDENTIFIER'])
+        self.assertEqual(tokens.values[1], 'é')
+        self.assertEqual(interpret("let é = 1\nprint é\n"), [1])
+
+
+class FoldTest(unittest.TestCase):
+    def test_constant_subtrees_fold(self):
+        self.assertEqual(parse("print 2 * 3 + 7 / 0 - 9 % 4\n"), [('PRINT', num(5))])
+        self.assertEqual(parse("print x + 2 * 3\n"), [('PRINT', (OP_ADD, name('x'), num(6)))])
+
+
+class LoopInvariantTest(unittest.TestCase):
+    def test_invariant_subtree_is_hoisted(self):
+        source = "let a = 2\nlet b = 3\nlet s = 0\nfor i = 1 to 3\n    let s = s + a * b\nprint s\n"
+        self.assertEqual(parse(source), [
+            ('ASSIGN', 'a', num(2)),
+            ('ASSIGN', 'b', num(3)),
+            ('ASSIGN', 's', num(0)),
+            ('ASSIGN', '$inv0', (OP_MUL, name('a'), name('b'))),
+            ('FOR', 'i', num(1), num(3), [('ASSIGN', 's', (OP_ADD, name('s'), name('$inv0')))]),
+            ('PRINT', name('s')),
+        ])
+        self.assertEqual(interpret(source), [18])
+
+    def test_operand_assigned_in_body_is_not_hoisted(self):
+        source = "let a = 2\nlet s = 0\nwhile s < 10\n    let s = s + a * 2\n    let a = a + 1\nprint s\n"
+        body = parse(source)[2][2]
+        self.assertEqual(body[0], ('ASSIGN', 's', (OP_ADD, name('s'), (OP_MUL, name('a'), num(2)))))
+        self.assertEqual(interpret(source), [10])
+
+    def test_for_variable_is_not_hoisted(self):
+        source = "let a = 2\nfor i = 1 to 3\n    print i * a\n"
+        self.assertEqual(parse(source), [
+            ('ASSIGN', 'a', num(2)),
+            ('FOR', 'i', num(1), num(3), [('PRINT', (OP_MUL, name('i'), name('a')))]),
+        ])
+        self.assertEqual(interpret(source), [2, 4, 6])
+
+    def test_name_assigned_in_one_branch_is_not_defined(self):
+        source = ("let c = 0\nif c > 0\n    let a = 5\nlet i = 0\nwhile i < 2\n"
+                  "    let i = i + 1\n    if i > 5\n        print a * 2\nprint i\n")
+        statements = parse(source)
+        self.assertNotIn('$inv0', [stmt[1] for stmt in statements if stmt[0] == 'ASSIGN'])
+        self.assertEqual(interpret(source), [2])
+
+    def test_name_assigned_in_both_branches_is_defined(self):
+        source = ("let c = 1\nif c > 0\n    let a = 5\nelse\n    let a = 6\nlet i = 0\nwhile i < 2\n"
+                  "    print a * 2\n    let i = i + 1\n")
+        statements = parse(source)
+        self.assertEqual(statements[3], ('ASSIGN', '$inv0', (OP_MUL, name('a'), num(2))))
+        self.assertEqual(statements[4], ('WHILE', (OP_LT, name('i'), num(2)), [
+            ('PRINT', name('$inv0')),
+            ('ASSIGN', 'i', (OP_ADD, name('i'), num(1))),
+        ]))
+        self.assertEqual(interpret(source), [10, 10])
+
+    def test_zero_iteration_loop_reads_undefined_name(self):
+        source = "for i = 1 to 0\n    print y * 2\nprint 7\n"
+        self.assertEqual(parse(source), [
+            ('FOR', 'i', num(1), num(0), [('PRINT', (OP_MUL, name('y'), num(2)))]),
+            ('PRINT', num(7)),
+        ])
+        self.assertEqual(interpret(source), [7])
+        self.assertEqual(run_vm(source, False), [7])
+
+    def test_inner_loop_temp_moves_out_again(self):
+        source = "let a = 2\nlet b = 3\nfor i = 1 to 2\n    for j = 1 to 2\n        print a * b + j\n"
+        self.assertEqual(parse(source), [
+            ('ASSIGN', 'a', num(2)),
+            ('ASSIGN', 'b', num(3)),
+            ('ASSIGN', '$inv1', (OP_MUL, name('a'), name('b'))),
+            ('FOR', 'i', num(1), num(2), [
+                ('ASSIGN', '$inv0', name('$inv1')),
+                ('FOR', 'j', num(1), num(2), [('PRINT', (OP_ADD, name('$inv0'), name('j')))]),
+            ]),
+        ])
+        self.assertEqual(interpret(source), [7, 8, 7, 8])
+
+
+class StreamingParserTest(unittest.TestCase):
+    def test_streamed_tokens_give_same_ast(self):
+        for name, source in PROGRAMS.items():
+            with self.subTest(program=name):
+                self.assertEqual(Parser(Lexer(source).iter_tokens()).parse(), parse(source))
+
+    def test_token_pairs_give_same_ast(self):
+        source = PROGRAMS['loops']
+        self.assertEqual(Parser(list(Lexer(source).iter_tokens())).parse(), parse(source))
+
+    def test_released_token_is_an_error(self):
+        parser = Parser(Lexer(PROGRAMS['loops']).iter_tokens())
+        parser.parse()
+        with self.assertRaisesRegex(LookupError, "already been released"):
+            parser._type_at(0)
+
+
+class CompilerTest(unittest.TestCase):
+    def test_compile_is_reentrant(self):
+        compiler = Compiler()
+        compiler.compile(parse("print 1\n"))
+        output = []
+        VM(*compiler.compile(parse("print 2\n")), output.append, jit=False).run()
+        self.assertEqual(output, [2])
+
+
+if __name__ == '__main__':
+    unittest.main()